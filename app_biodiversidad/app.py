@@ -7,8 +7,9 @@ from pathlib import Path  # Importo Path para manejar rutas de archivos
 
 from utils import (
     leer_archivo_subido,     # Función que uso para leer los archivos cargados (csv/xlsx)
-    limpiar_dataframe,       # Función que limpia y estandariza la columna de especie
-    construir_interseccion,  # Función que calcula las especies coincidentes entre las fuentes
+    construir_tabla_final,      # Función que limpia las fuentes, calcula las coincidencias y agrega las columnas extra
+    categorias_mas_frecuentes,  # Función que cuenta las categorías más frecuentes de una columna
+    tabla_a_csv,                # Función que convierte la tabla final en un CSV para descargar
 )
 
 # ----------------------------------------------------------------------
@@ -24,10 +25,21 @@ st.set_page_config(             # Configuro la página principal de Streamlit
     layout="wide",                # Uso el layout ancho para aprovechar la pantalla completa
 )
 
+
+@st.cache_resource(show_spinner=False)  # Leo el CSS del disco una sola vez, no en cada recarga
+def cargar_css(ruta):
+    with open(ruta) as f:                 # Abro el archivo
+        return f.read()                   # Devuelvo el texto del CSS
+
+
+@st.cache_resource(show_spinner=False)  # Leo el logo del disco una sola vez, no en cada recarga
+def cargar_logo(ruta):
+    return ruta.read_bytes()              # Devuelvo los bytes de la imagen
+
+
 css_path = Path("assets/styles.css")  # Ruta del archivo CSS con los estilos personalizados
 if css_path.exists():                 # Si el css existe lo cargo
-    with open(css_path) as f:         # Abro el archivo
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)  # Inyecto el CSS en la página
+    st.markdown(f"<style>{cargar_css(css_path)}</style>", unsafe_allow_html=True)  # Inyecto el CSS en la página
 
 # ----------------------------------------------------------------------
 # ESTADO: NÚMERO DE FUENTES
@@ -50,7 +62,7 @@ st.markdown('<div class="app-shell">', unsafe_allow_html=True)  # Inicio el cont
 if logo_path.exists():                                # Si el logo existe
     col_left, col_center, col_right = st.columns([1, 2, 1])  # Creo tres columnas para centrarlo
     with col_center:                                  # Pongo el logo en la columna central
-        st.image(str(logo_path), width=580)           # Muestro el logo con un ancho grande
+        st.image(cargar_logo(logo_path), width=580)   # Muestro el logo con un ancho grande
 
 st.markdown('<div class="biodata-header">BioData Manager</div>', unsafe_allow_html=True)  # Barra con el título de la app
 st.markdown('<div class="main-card">', unsafe_allow_html=True)   # Contenedor principal tipo “tarjeta”
@@ -95,38 +107,58 @@ st.markdown(
 )
 
 # Tarjetas de fuentes en filas de 3
-for start in range(0, num_sources, 3):         # Recorro las fuentes de 3 en 3 para hacer filas
-    cols = st.columns(3)                       # Creo 3 columnas para cada fila
-    for i in range(start, min(start + 3, num_sources)):  # Recorro los índices dentro de la fila
-        fuente_idx = i                         # Índice de la fuente actual
-        nombre_base = default_names[i] if i < len(default_names) else f"Fuente {i+1}"  # Nombre visible de la fuente
-
-        with cols[i - start]:                  # Pinto el contenido en la columna que le corresponde
-            st.caption(nombre_base)            # Muestro el nombre de la fuente como caption
-
-            st.file_uploader(                  # Widget para subir el archivo de la fuente
-                f"Archivo {nombre_base} (CSV / Excel)",  # Texto interno
-                type=["csv", "xlsx"],                  # Tipos permitidos
-                key=f"file_{fuente_idx}",              # Clave única en session_state
-                label_visibility="collapsed",          # Oculto la etiqueta para que se vea más limpio
-            )
+@st.fragment                                   # Fragmento: al interactuar aquí solo se recarga este panel, no toda la app
+def panel_fuentes():
+    n_fuentes = st.session_state.num_sources   # Leo el número de fuentes actual (puede cambiar dentro del fragmento)
+
+    for start in range(0, n_fuentes, 3):           # Recorro las fuentes de 3 en 3 para hacer filas
+        cols = st.columns(3)                       # Creo 3 columnas para cada fila
+        for i in range(start, min(start + 3, n_fuentes)):  # Recorro los índices dentro de la fila
+            fuente_idx = i                         # Índice de la fuente actual
+            nombre_base = default_names[i] if i < len(default_names) else f"Fuente {i+1}"  # Nombre visible de la fuente
+
+            with cols[i - start]:                  # Pinto el contenido en la columna que le corresponde
+                st.caption(nombre_base)            # Muestro el nombre de la fuente como caption
+
+                st.file_uploader(                  # Widget para subir el archivo de la fuente
+                    f"Archivo {nombre_base} (CSV / Excel)",  # Texto interno
+                    type=["csv", "xlsx"],                  # Tipos permitidos
+                    key=f"file_{fuente_idx}",              # Clave única en session_state
+                    label_visibility="collapsed",          # Oculto la etiqueta para que se vea más limpio
+                )
 
-            st.text_input(                      # Input para que el usuario escriba la columna de especie
-                f"Columna de especie en {nombre_base}",
-                value="scientificName",         # Valor por defecto
-                key=f"species_col_{fuente_idx}",  # Clave en session_state
-            )
+                st.text_input(                      # Input para que el usuario escriba la columna de especie
+                    f"Columna de especie en {nombre_base}",
+                    value="scientificName",         # Valor por defecto
+                    key=f"species_col_{fuente_idx}",  # Clave en session_state
+                )
+
+                st.text_input(                      # Input para que el usuario pueda añadir una columna extra opcional
+                    f"Columna extra a añadir desde {nombre_base} (opcional)",
+                    value="",                       # Empieza vacío
+                    key=f"extra_col_{fuente_idx}",  # Clave en session_state
+                )
+
+    # Botón para agregar más fuentes
+    if st.button("➕ Agregar otra fuente"):  # Si doy clic en el botón de agregar fuente
+        st.session_state.num_sources += 1   # Aumento en 1 el número de fuentes
+        st.rerun(scope="fragment")          # Recargo solo este panel para que aparezca la nueva tarjeta de entrada
+
+    # Si cambió algún archivo subido, recargo toda la app para actualizar la vista rápida
+    # (solo cuento las tarjetas con archivo, así agregar una tarjeta vacía no recarga toda la app)
+    archivos = {                               # Identificador de cada archivo subido, por número de tarjeta
+        i: archivo.file_id
+        for i in range(n_fuentes)
+        if (archivo := st.session_state.get(f"file_{i}")) is not None
+    }
+    if archivos != st.session_state.get("archivos_subidos"):  # Si no son los mismos de la última vez
+        primera_vez = "archivos_subidos" not in st.session_state  # En la primera carga no hace falta recargar
+        st.session_state["archivos_subidos"] = archivos  # Guardo los archivos actuales
+        if not primera_vez:
+            st.rerun()                         # Recargo toda la app (no solo el fragmento)
 
-            st.text_input(                      # Input para que el usuario pueda añadir una columna extra opcional
-                f"Columna extra a añadir desde {nombre_base} (opcional)",
-                value="",                       # Empieza vacío
-                key=f"extra_col_{fuente_idx}",  # Clave en session_state
-            )
 
-# Botón para agregar más fuentes
-if st.button("➕ Agregar otra fuente"):      # Si doy clic en el botón de agregar fuente
-    st.session_state.num_sources += 1       # Aumento en 1 el número de fuentes
-    st.rerun()                              # Recargo la app para que aparezca la nueva tarjeta de entrada
+panel_fuentes()                                # Pinto el panel de fuentes
 
 # ----------------------------------------------------------------------
 # CARGA A DATAFRAMES Y VISTA RÁPIDA
@@ -136,16 +168,25 @@ sources_info = []                           # Aquí voy a guardar la info de cad
 
 for i in range(num_sources):                # Recorro todas las posibles fuentes
     file_obj = st.session_state.get(f"file_{i}")  # Recupero el archivo subido para la fuente i
-    if file_obj is not None:               # Si hay archivo cargado
+    if file_obj is None:                   # Si no hay archivo (o lo quitaron)
+        st.session_state.pop(f"parsed_{i}_id", None)  # libero el DataFrame que tenía guardado
+        st.session_state.pop(f"parsed_{i}_df", None)
+    else:                                  # Si hay archivo cargado
         nombre_base = default_names[i] if i < len(default_names) else f"Fuente {i+1}"  # Nombre de la fuente
         species_col = st.session_state.get(f"species_col_{i}", "")  # Nombre de la columna de especie
         extra_col = st.session_state.get(f"extra_col_{i}", "")      # Nombre de la columna extra
 
-        df_raw = leer_archivo_subido(file_obj)  # Leo el archivo (csv/xlsx) y lo convierto en DataFrame
+        if st.session_state.get(f"parsed_{i}_id") == file_obj.file_id:  # Si ya leí este mismo archivo antes
+            df_raw = st.session_state[f"parsed_{i}_df"]                  # reuso el DataFrame guardado
+        else:
+            df_raw = leer_archivo_subido(file_obj)  # Leo el archivo (csv/xlsx) y lo convierto en DataFrame
+            st.session_state[f"parsed_{i}_id"] = file_obj.file_id  # Guardo qué archivo leí
+            st.session_state[f"parsed_{i}_df"] = df_raw            # y su DataFrame para las próximas recargas
 
         sources_info.append(              # Agrego la info de esta fuente a la lista
             {
                 "name": nombre_base,      # Nombre
+                "file_id": file_obj.file_id,  # Identificador del archivo subido
                 "df_raw": df_raw,         # DataFrame original
                 "species_col": species_col,      # Columna de especie
                 "extra_col": extra_col.strip(),  # Columna extra (le quito espacios a los lados)
@@ -177,16 +218,26 @@ st.markdown("---")                         # Otro separador visual
 
 procesar = st.button("🔍 Procesar y buscar especies coincidentes")  # Botón para lanzar todo el procesamiento
 
+entradas_actuales = (                      # Resumen de lo que hay ahora en el formulario (búsqueda y fuentes)
+    busqueda,
+    tuple(
+        (src["name"], src["file_id"], (src["species_col"] or "").strip(), src["extra_col"])
+        for src in sources_info
+    ),
+)
+
 if procesar:                               # Si el usuario hizo clic en procesar
+    st.session_state.pop("tabla_final", None)   # Borro resultados anteriores para no mostrar algo viejo si falla
+    st.session_state.pop("species_counts", None)
+    st.session_state.pop("entradas_resultado", None)
 
     if not sources_info:                   # Si no hay ninguna fuente cargada
         st.error("Por favor, carga al menos una base de datos en las tarjetas de arriba.")
     else:
         try:
-            fuentes_limpias: dict[str, pd.DataFrame] = {}  # Aquí guardo los DataFrames limpios
-            extra_cols_map: dict[str, str] = {}            # Aquí guardo qué columna extra usar de cada fuente
+            fuentes = []                                   # Aquí guardo (nombre, df, columna especie, columna extra) de cada fuente
 
-            # 1. Limpieza por fuente
+            # Validación de las columnas por fuente
             for src in sources_info:                       # Recorro cada fuente cargada
                 nombre = src["name"]                       # Nombre de la fuente
                 df_raw = src["df_raw"]                     # DataFrame original
@@ -197,196 +248,181 @@ if procesar:                               # Si el usuario hizo clic en procesar
                     st.error(f"Debes indicar la columna de especie para {nombre}.")
                     st.stop()                              # Detengo la app hasta que lo corrijan
 
-                df_clean = limpiar_dataframe(df_raw, species_col, columna_estandar)  # Limpio y estandarizo
-                fuentes_limpias[nombre] = df_clean         # Guardo el DataFrame limpio
+                if extra_col and extra_col not in df_raw.columns:  # Reviso si la columna extra existe en el archivo
+                    st.warning(
+                        f"La columna extra '{extra_col}' no se encontró en la fuente {nombre}. "
+                        "No se agregará al resultado."
+                    )                                      # Si no existe, aviso pero sigo
+                    extra_col = ""
 
-                if extra_col:                              # Si el usuario pidió una columna extra
-                    if extra_col not in df_clean.columns:  # Reviso si existe en el DataFrame limpio
-                        st.warning(
-                            f"La columna extra '{extra_col}' no se encontró en la fuente {nombre}. "
-                            "No se agregará al resultado."
-                        )                                  # Si no existe, aviso pero sigo
-                    else:
-                        extra_cols_map[nombre] = extra_col # La guardo para usarla luego en los merges
+                fuentes.append((nombre, df_raw, species_col, extra_col))  # Guardo la fuente lista para procesar
 
-            if not fuentes_limpias:                        # Si después de todo no hay fuentes válidas
+            if not fuentes:                                # Si después de todo no hay fuentes válidas
                 st.warning("No se ha cargado ninguna base de datos válida.")
                 st.stop()                                  # Detengo el flujo
 
-            # 2. Intersección de especies
-            species_sets, tabla_interseccion = construir_interseccion(  # Calculo especies coincidentes
-                fuentes_limpias, columna_estandar
+            # 1-4. Limpieza, búsqueda, intersección y columnas extra (queda en caché entre recargas)
+            species_counts, tabla_final = construir_tabla_final(
+                tuple(fuentes), columna_estandar, busqueda
             )
 
-            # 3. Agregar columnas extra
-            tabla_final = tabla_interseccion.copy()        # Empiezo desde la tabla de intersección
+            st.session_state["tabla_final"] = tabla_final    # Guardo el resultado para que los widgets de abajo
+            st.session_state["species_counts"] = species_counts  # no tengan que volver a procesar todo al cambiar
+            st.session_state["entradas_resultado"] = entradas_actuales  # Guardo con qué entradas se calculó
 
-            for nombre_fuente, extra_col in extra_cols_map.items():  # Recorro las fuentes con columna extra válida
-                df_src = (
-                    fuentes_limpias[nombre_fuente][[columna_estandar, extra_col]]
-                    .drop_duplicates(subset=[columna_estandar])      # Quito duplicados por especie
-                )
-                nuevo_nombre_col = f"{nombre_fuente}_{extra_col}"    # Nombre final de la columna extra
+        except ValueError as e:                        # Si hay un error de valor (por ejemplo formato de datos)
+            st.error(f"Ocurrió un problema: {e}")
+        except Exception as e:                         # Cualquier otro error inesperado
+            st.error(f"Ocurrió un error inesperado: {e}")
 
-                tabla_final = tabla_final.merge(          # Hago merge para agregar esa columna extra
-                    df_src.rename(columns={extra_col: nuevo_nombre_col}),
-                    on=columna_estandar,                  # Uno por el nombre científico estándar
-                    how="left",                           # Mantengo todas las especies de la intersección
+if "tabla_final" in st.session_state:      # Si ya hay resultados procesados los muestro
+    df_resultado = st.session_state["tabla_final"]   # Tabla final (la búsqueda ya se aplicó al procesar)
+    species_counts = st.session_state["species_counts"]  # Número de especies únicas por fuente
+
+    # 5. Mostrar resultados básicos
+    st.markdown(
+        '<div class="app-section-title">Resultado: especies coincidentes</div>',  # Título de la sección de resultados
+        unsafe_allow_html=True,
+    )
+
+    if st.session_state.get("entradas_resultado") != entradas_actuales:  # Si cambiaron la búsqueda, los archivos o las columnas
+        st.warning(
+            "La búsqueda, los archivos o las columnas cambiaron desde el último procesamiento. "
+            "Estos resultados están desactualizados: pulsa el botón para procesar de nuevo."
+        )
+
+    n_inter = len(df_resultado)                   # Número de especies en el resultado filtrado
+    st.write(
+        f"Se encontraron **{n_inter}** especies coincidentes "
+        f"(presentes en al menos 2 fuentes)."
+    )
+
+    if n_inter > 0:                               # Si hay al menos una especie
+        st.dataframe(df_resultado)                # Muestro la tabla de resultados
+
+        csv_bytes = tabla_a_csv(df_resultado, ";")  # Convierto el DataFrame a CSV (UTF-8 con BOM, separado por punto y coma)
+
+        st.download_button(                       # Botón para descargar la tabla como CSV
+            label="💾 Descargar tabla de especies coincidentes (.csv)",
+            data=csv_bytes,
+            file_name="especies_coincidentes.csv",
+            mime="text/csv",
+        )
+
+    # ------------------------------------------------------------
+    # 6. VISUALIZACIÓN GRÁFICA DE RESULTADOS
+    # ------------------------------------------------------------
+    if n_inter > 0:                               # Solo tiene sentido graficar si hay resultados
+        st.markdown(
+            '<div class="app-section-title">Visualización gráfica de resultados</div>',
+            unsafe_allow_html=True,
+        )
+
+        with st.expander("📊 Ver gráficos a partir de la tabla final"):  # Expander para mostrar u ocultar gráficos
+            # 6.1. Especies coincidentes por fuente
+            st.subheader("Especies coincidentes por fuente")
+
+            coincid_por_fuente = {}               # Diccionario para guardar cuántas especies por fuente
+            for nombre_fuente in species_counts.keys():  # Recorro las fuentes
+                if nombre_fuente in df_resultado.columns:  # Solo si hay columna 0/1 para esa fuente
+                    coincid_por_fuente[nombre_fuente] = int(
+                        df_resultado[nombre_fuente].sum()  # Sumo los 1 para contar cuántas especies ahí
+                    )
+
+            if coincid_por_fuente:                # Si hay datos para graficar
+                df_plot_fuentes = (
+                    pd.DataFrame.from_dict(
+                        coincid_por_fuente,
+                        orient="index",
+                        columns=["Especies coincidentes"],
+                    )
+                    .sort_values("Especies coincidentes", ascending=False)  # Ordeno de mayor a menor
+                )
+                st.bar_chart(df_plot_fuentes)     # Muestro un gráfico de barras con esas cantidades
+            else:
+                st.write(
+                    "No se encontraron columnas de presencia por fuente en la tabla final."
                 )
 
-            # 4. Filtro de búsqueda
-            df_resultado = tabla_final                    # Empiezo del resultado completo
-            if busqueda:                                  # Si el usuario escribió algo en el buscador
-                df_resultado = df_resultado[
-                    df_resultado[columna_estandar]
-                    .str.contains(busqueda, case=False, na=False)  # Filtro por nombre de especie que contenga el texto
-                ]
-
-            # 5. Mostrar resultados básicos
-            st.markdown(
-                '<div class="app-section-title">Resultado: especies coincidentes</div>',  # Título de la sección de resultados
-                unsafe_allow_html=True,
-            )
+            st.markdown("---")                     # Separador dentro del expander
 
-            n_inter = len(df_resultado)                   # Número de especies en el resultado filtrado
-            st.write(
-                f"Se encontraron **{n_inter}** especies coincidentes "
-                f"(presentes en al menos 2 fuentes)."
-            )
+            # 6.2. Distribución del número de fuentes por especie
+            if "num_fuentes" in df_resultado.columns:  # Reviso que exista la columna num_fuentes
+                st.subheader("Distribución de número de fuentes por especie")
 
-            if n_inter > 0:                               # Si hay al menos una especie
-                st.dataframe(df_resultado)                # Muestro la tabla de resultados
+                conteo_num = (
+                    df_resultado["num_fuentes"]
+                    .value_counts()
+                    .sort_index()                 # Cuento cuántas especies tienen 2, 3, 4 fuentes, etc.
+                )
 
-                csv_bytes = df_resultado.to_csv(          # Convierto el DataFrame a CSV en memoria
-                    index=False,
-                    sep=";",                              # Uso punto y coma como separador
-                ).encode("utf-8-sig")                     # Codifico en UTF-8 con BOM
+                df_hist = conteo_num.reset_index()  # Lo paso a DataFrame
+                df_hist.columns = ["num_fuentes", "n_especies"]  # Renombro columnas
 
-                st.download_button(                       # Botón para descargar la tabla como CSV
-                    label="💾 Descargar tabla de especies coincidentes (.csv)",
-                    data=csv_bytes,
-                    file_name="especies_coincidentes.csv",
-                    mime="text/csv",
+                st.bar_chart(df_hist.set_index("num_fuentes"))  # Gráfico de barras con num_fuentes en el eje x
+            else:
+                st.write(
+                    "La columna 'num_fuentes' no está disponible en la tabla final."
                 )
 
-            # ------------------------------------------------------------
-            # 6. VISUALIZACIÓN GRÁFICA DE RESULTADOS
-            # ------------------------------------------------------------
-            if n_inter > 0:                               # Solo tiene sentido graficar si hay resultados
-                st.markdown(
-                    '<div class="app-section-title">Visualización gráfica de resultados</div>',
-                    unsafe_allow_html=True,
+            st.markdown("---")                     # Otro separador
+
+            # 6.3. Columna categórica extra (si existe)
+            st.subheader("Distribución de una columna categórica adicional")
+
+            cols_candidatas = []                  # Aquí voy a guardar las columnas categóricas posibles
+            columnas_binarias = set(species_counts.keys()) | {
+                "num_fuentes",
+                columna_estandar,
+            }                                     # Columnas que NO quiero usar como categóricas
+
+            for col in df_resultado.columns:      # Recorro todas las columnas del resultado
+                if col in columnas_binarias:      # Si la columna es binaria o especial la salto
+                    continue
+                if pd.api.types.is_string_dtype(df_resultado[col].dtype):  # Solo quiero columnas de texto (categóricas)
+                    cols_candidatas.append(col)
+
+            if cols_candidatas:                   # Si hay columnas categóricas candidatas
+                col_sel = st.selectbox(           # Dejo que el usuario escoja cuál quiere ver
+                    "Selecciona una columna categórica para resumir",
+                    cols_candidatas,
                 )
 
-                with st.expander("📊 Ver gráficos a partir de la tabla final"):  # Expander para mostrar u ocultar gráficos
-                    # 6.1. Especies coincidentes por fuente
-                    st.subheader("Especies coincidentes por fuente")
-
-                    coincid_por_fuente = {}               # Diccionario para guardar cuántas especies por fuente
-                    for nombre_fuente in species_sets.keys():  # Recorro las fuentes
-                        if nombre_fuente in df_resultado.columns:  # Solo si hay columna 0/1 para esa fuente
-                            coincid_por_fuente[nombre_fuente] = int(
-                                df_resultado[nombre_fuente].sum()  # Sumo los 1 para contar cuántas especies ahí
-                            )
-
-                    if coincid_por_fuente:                # Si hay datos para graficar
-                        df_plot_fuentes = (
-                            pd.DataFrame.from_dict(
-                                coincid_por_fuente,
-                                orient="index",
-                                columns=["Especies coincidentes"],
-                            )
-                            .sort_values("Especies coincidentes", ascending=False)  # Ordeno de mayor a menor
-                        )
-                        st.bar_chart(df_plot_fuentes)     # Muestro un gráfico de barras con esas cantidades
-                    else:
-                        st.write(
-                            "No se encontraron columnas de presencia por fuente en la tabla final."
-                        )
-
-                    st.markdown("---")                     # Separador dentro del expander
-
-                    # 6.2. Distribución del número de fuentes por especie
-                    if "num_fuentes" in df_resultado.columns:  # Reviso que exista la columna num_fuentes
-                        st.subheader("Distribución de número de fuentes por especie")
-
-                        conteo_num = (
-                            df_resultado["num_fuentes"]
-                            .value_counts()
-                            .sort_index()                 # Cuento cuántas especies tienen 2, 3, 4 fuentes, etc.
-                        )
-
-                        df_hist = conteo_num.reset_index()  # Lo paso a DataFrame
-                        df_hist.columns = ["num_fuentes", "n_especies"]  # Renombro columnas
-
-                        st.bar_chart(df_hist.set_index("num_fuentes"))  # Gráfico de barras con num_fuentes en el eje x
-                    else:
-                        st.write(
-                            "La columna 'num_fuentes' no está disponible en la tabla final."
-                        )
-
-                    st.markdown("---")                     # Otro separador
-
-                    # 6.3. Columna categórica extra (si existe)
-                    st.subheader("Distribución de una columna categórica adicional")
-
-                    cols_candidatas = []                  # Aquí voy a guardar las columnas categóricas posibles
-                    columnas_binarias = set(species_sets.keys()) | {
-                        "num_fuentes",
-                        columna_estandar,
-                    }                                     # Columnas que NO quiero usar como categóricas
-
-                    for col in df_resultado.columns:      # Recorro todas las columnas del resultado
-                        if col in columnas_binarias:      # Si la columna es binaria o especial la salto
-                            continue
-                        if df_resultado[col].dtype == "object":  # Solo quiero columnas de texto (categóricas)
-                            cols_candidatas.append(col)
-
-                    if cols_candidatas:                   # Si hay columnas categóricas candidatas
-                        col_sel = st.selectbox(           # Dejo que el usuario escoja cuál quiere ver
-                            "Selecciona una columna categórica para resumir",
-                            cols_candidatas,
-                        )
-
-                        top_vals = (
-                            df_resultado[col_sel]
-                            .value_counts()
-                            .head(10)                     # Tomo las 10 categorías más frecuentes
-                        )
-
-                        st.bar_chart(top_vals)            # Muestro un gráfico de barras con esas categorías
-                        st.caption("Se muestran las 10 categorías más frecuentes.")
-                    else:
-                        st.write(
-                            "Por ahora no hay columnas categóricas adicionales para graficar. "
-                            "Puedes definir una columna extra en alguna fuente para que aparezca aquí."
-                        )
-
-            # ------------------------------------------------------------
-            # 7. INDICADORES POR FUENTE
-            # ------------------------------------------------------------
-
-            st.markdown(
-                '<div class="app-section-title">Indicadores por fuente</div>',  # Título de esta sección
-                unsafe_allow_html=True,
-            )
+                top_vals = categorias_mas_frecuentes(  # Tomo las 10 categorías más frecuentes (en caché)
+                    df_resultado,
+                    st.session_state["entradas_resultado"],  # La tabla queda identificada por las entradas con que se calculó
+                    col_sel,
+                    10,
+                )
 
-            datos_indicadores = []                     # Lista para guardar los indicadores
-            for nombre_fuente, conj in species_sets.items():  # Recorro las fuentes y su conjunto de especies
-                datos_indicadores.append(
-                    {"Fuente": nombre_fuente, "N° especies únicas": len(conj)}  # Guardo cuántas especies únicas hay en cada fuente
+                st.bar_chart(top_vals)            # Muestro un gráfico de barras con esas categorías
+                st.caption("Se muestran las 10 categorías más frecuentes.")
+            else:
+                st.write(
+                    "Por ahora no hay columnas categóricas adicionales para graficar. "
+                    "Puedes definir una columna extra en alguna fuente para que aparezca aquí."
                 )
 
-            if datos_indicadores:                      # Si tengo indicadores
-                df_ind = pd.DataFrame(datos_indicadores)      # Los paso a DataFrame
-                st.dataframe(df_ind)                   # Muestro la tabla de indicadores
-                st.bar_chart(df_ind.set_index("Fuente")["N° especies únicas"])  # Gráfico de barras con especies únicas por fuente
+    # ------------------------------------------------------------
+    # 7. INDICADORES POR FUENTE
+    # ------------------------------------------------------------
 
-        except ValueError as e:                        # Si hay un error de valor (por ejemplo formato de datos)
-            st.error(f"Ocurrió un problema: {e}")
-        except Exception as e:                         # Cualquier otro error inesperado
-            st.error(f"Ocurrió un error inesperado: {e}")
-else:
+    st.markdown(
+        '<div class="app-section-title">Indicadores por fuente</div>',  # Título de esta sección
+        unsafe_allow_html=True,
+    )
+
+    datos_indicadores = []                     # Lista para guardar los indicadores
+    for nombre_fuente, n_especies in species_counts.items():  # Recorro las fuentes y su número de especies
+        datos_indicadores.append(
+            {"Fuente": nombre_fuente, "N° especies únicas": n_especies}  # Guardo cuántas especies únicas hay en cada fuente
+        )
+
+    if datos_indicadores:                      # Si tengo indicadores
+        df_ind = pd.DataFrame(datos_indicadores)      # Los paso a DataFrame
+        st.dataframe(df_ind)                   # Muestro la tabla de indicadores
+        st.bar_chart(df_ind.set_index("Fuente")["N° especies únicas"])  # Gráfico de barras con especies únicas por fuente
+elif not procesar:
     st.info(                                          # Mensaje cuando aún no se ha presionado el botón de procesar
         "Sube tus archivos en las tarjetas superiores, configura las columnas de especie y, si lo deseas, "
         "las columnas extra. Luego pulsa el botón para procesar."
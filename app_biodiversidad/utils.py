@@ -4,9 +4,135 @@ Funciones de apoyo para la app BioData Manager:
 - leer_archivo_subido
 - limpiar_dataframe
 - construir_interseccion
+- construir_tabla_final
+- categorias_mas_frecuentes
+- tabla_a_csv
 """
 
+import csv  # Uso csv.Sniffer para adivinar el separador de los CSV
+import importlib.util  # Uso importlib para saber si hay un lector de Excel más rápido instalado
+import io  # Uso io para volver a envolver los bytes del archivo como si fuera un archivo
+from concurrent.futures import ThreadPoolExecutor  # Uso hilos para limpiar varias fuentes a la vez
+
+import numpy as np  # Uso numpy para los tipos numéricos pequeños (int8)
 import pandas as pd  # Uso pandas para manejar todas las tablas de datos
+import pyarrow as pa  # Uso pyarrow para normalizar textos sin pasar por objetos de Python
+import pyarrow.compute as pc  # Funciones de pyarrow que trabajan sobre columnas completas
+import pyarrow.csv as pa_csv  # Escritor de CSV de pyarrow (en C++)
+import streamlit as st  # Uso st.cache_data para no repetir trabajo en cada recarga de la app
+
+try:
+    # numba está en requirements.txt y compila el cálculo de presencias;
+    # si en algún entorno no está instalado, uso el camino de pandas (Index.isin)
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Cuántos bytes del inicio del CSV miro para adivinar el separador
+TAM_MUESTRA_SEPARADOR = 64 * 1024
+
+# Separadores que acepto al adivinar el de un CSV
+SEPARADORES_CSV = ",;\t|"
+
+# Marca BOM de UTF-8 para que Excel abra bien los acentos del CSV descargado
+BOM_UTF8 = b"\xef\xbb\xbf"
+
+# Si pyarrow no puede escribir la tabla, pandas la escribe en bloques de este tamaño
+FILAS_POR_BLOQUE_CSV = 50_000
+
+# Máximo de hilos para limpiar las fuentes en paralelo
+MAX_HILOS_LIMPIEZA = 8
+
+# Hasta cuántas fuentes uso la intersección por punteros sobre listas ordenadas (con más, la matriz completa)
+MAX_FUENTES_INTERSECCION_ORDENADA = 5
+
+# Límites de las cachés: cuántos resultados guarda cada una y cuánto tiempo (en segundos)
+# (sin límite, cada archivo o búsqueda distinta se quedaría en memoria mientras viva el servidor)
+MAX_ARCHIVOS_EN_CACHE = 16
+MAX_RESULTADOS_EN_CACHE = 4
+MAX_RESUMENES_EN_CACHE = 32
+DURACION_CACHE = 60 * 60
+
+# Si python-calamine está instalado, lo uso para leer Excel (es mucho más rápido que openpyxl)
+MOTOR_EXCEL = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _marcar_presencia(codigos, limites, n_especies):
+        """
+        Marca con 1 las especies (por código) que aparecen en cada fuente.
+        :param codigos: códigos de especie de todas las fuentes, una fuente detrás de otra
+        :param limites: posición donde empieza cada fuente en codigos (y el final de la última)
+        :param n_especies: número de especies distintas
+        :return: matriz int8 (especies x fuentes)
+        """
+        n_fuentes = len(limites) - 1
+        presencia = np.zeros((n_especies, n_fuentes), dtype=np.int8)
+        # Cada fuente escribe en su propia columna, así que puedo repartirlas entre hilos
+        for j in prange(n_fuentes):
+            for k in range(limites[j], limites[j + 1]):
+                presencia[codigos[k], j] = 1
+        return presencia
+
+    @njit(cache=True)
+    def _intersectar_ordenados(codigos, limites, n_especies):
+        """
+        Recorre a la vez los códigos ordenados de todas las fuentes (un puntero por fuente)
+        y se queda solo con las especies que aparecen en 2 o más fuentes.
+        :param codigos: códigos de especie de todas las fuentes, cada fuente ordenada de menor a mayor
+        :param limites: posición donde empieza cada fuente en codigos (y el final de la última)
+        :param n_especies: número de especies distintas
+        :return:
+            codigos_comunes: códigos de las especies presentes en al menos 2 fuentes
+            presencia: matriz int8 (especies comunes x fuentes)
+        """
+        n_fuentes = len(limites) - 1
+        # Una especie común usa al menos dos códigos, así que nunca hay más de la mitad,
+        # y tampoco puede haber más que especies distintas
+        maximo = min(len(codigos) // 2, n_especies)
+        codigos_comunes = np.empty(maximo, dtype=np.int64)
+        presencia = np.zeros((maximo, n_fuentes), dtype=np.int8)
+        if maximo == 0:
+            return codigos_comunes, presencia
+
+        punteros = limites[:-1].copy()
+        n = 0
+
+        while True:
+            # Busco el código más pequeño entre los punteros que aún no terminan
+            actual = -1
+            for j in range(n_fuentes):
+                if punteros[j] < limites[j + 1]:
+                    if actual == -1 or codigos[punteros[j]] < actual:
+                        actual = codigos[punteros[j]]
+            if actual == -1:
+                break
+
+            # Cuento cuántas fuentes tienen ese código (sin escribir nada todavía)
+            cuenta = 0
+            for j in range(n_fuentes):
+                if punteros[j] < limites[j + 1] and codigos[punteros[j]] == actual:
+                    cuenta += 1
+
+            # Si es común la guardo en la siguiente fila libre
+            if cuenta >= 2:
+                codigos_comunes[n] = actual
+                for j in range(n_fuentes):
+                    if punteros[j] < limites[j + 1] and codigos[punteros[j]] == actual:
+                        presencia[n, j] = 1
+                n += 1
+
+            # Avanzo las fuentes que tenían ese código
+            for j in range(n_fuentes):
+                if punteros[j] < limites[j + 1] and codigos[punteros[j]] == actual:
+                    punteros[j] += 1
+
+        # Copio solo las filas usadas para que el búfer grande se libere al salir
+        return codigos_comunes[:n].copy(), presencia[:n].copy()
+else:
+    _marcar_presencia = None
+    _intersectar_ordenados = None
 
 
 def leer_archivo_subido(file):
@@ -19,20 +145,53 @@ def leer_archivo_subido(file):
         # Si el usuario no ha subido nada, no tengo nada que leer
         return None
 
+    # Le paso al lector los bytes y el nombre (no el objeto de Streamlit),
+    # así la caché reconoce el archivo por su contenido y no lo vuelve a leer en cada recarga
+    return _leer_contenido(file.getvalue(), file.name)
+
+
+@st.cache_data(show_spinner=False, max_entries=MAX_ARCHIVOS_EN_CACHE, ttl=DURACION_CACHE)
+def _leer_contenido(contenido, nombre):
+    """
+    Convierte el contenido de un archivo (CSV o Excel) en un DataFrame.
+    El resultado queda en caché mientras el contenido y el nombre no cambien.
+    :param contenido: bytes del archivo
+    :param nombre: nombre del archivo (lo uso para saber la extensión)
+    :return: pandas.DataFrame
+    """
+    # Vuelvo a convertir los bytes en un objeto tipo archivo para que pandas lo pueda leer
+    file = io.BytesIO(contenido)
+
     # Tomo el nombre del archivo para saber su extensión
-    nombre = file.name
     extension = nombre.split(".")[-1].lower()  # Me quedo con lo que hay después del último punto
 
     # Si el archivo es CSV
     if extension == "csv":
-        # Leo el CSV; sep=None deja que pandas intente adivinar el separador
-        df = pd.read_csv(file, sep=None, engine="python")
+        # Adivino el separador una sola vez mirando solo el inicio del archivo
+        separador = _detectar_separador(contenido)
+
+        if separador is not None:
+            try:
+                # Con el separador conocido uso el lector de pyarrow (en C++ y con varios hilos)
+                df = pd.read_csv(
+                    file,
+                    sep=separador,
+                    engine="pyarrow",
+                    dtype_backend="pyarrow",
+                )
+                return df
+            except pd.errors.ParserError:
+                # Si pyarrow no puede con el archivo (por ejemplo filas irregulares), pruebo con el lector de C
+                file.seek(0)
+
+        # Leo el CSV con el lector de C de pandas (si no adiviné el separador, uso la coma)
+        df = pd.read_csv(file, sep=separador or ",", engine="c")
         return df
 
     # Si el archivo es Excel (xls o xlsx)
     if extension in ("xls", "xlsx"):
-        # Leo el archivo de Excel
-        df = pd.read_excel(file)
+        # Leo el archivo de Excel (con calamine si está disponible)
+        df = pd.read_excel(file, engine=MOTOR_EXCEL)
         return df
 
     # Si llega aquí, es un tipo de archivo que no estoy manejando
@@ -41,10 +200,40 @@ def leer_archivo_subido(file):
     )
 
 
-def limpiar_dataframe(df, columna_especie_original, columna_estandar):
+def _detectar_separador(contenido):
+    """
+    Intenta adivinar el separador de un CSV mirando solo sus primeros bytes.
+    :param contenido: bytes del archivo
+    :return: el separador encontrado o None si no se pudo adivinar
+    """
+    # Paso a texto solo la muestra; si se corta un carácter al final lo ignoro
+    muestra = contenido[:TAM_MUESTRA_SEPARADOR].decode("utf-8", errors="ignore")
+
+    # Si la muestra no es el archivo completo, quito la última línea (seguramente quedó cortada)
+    if len(contenido) > TAM_MUESTRA_SEPARADOR and "\n" in muestra:
+        muestra = muestra[: muestra.rindex("\n")]
+
+    try:
+        # Solo acepto los separadores habituales (si no, el Sniffer puede elegir una letra)
+        return csv.Sniffer().sniff(muestra, delimiters=SEPARADORES_CSV).delimiter
+    except csv.Error:
+        pass
+
+    # Si hay filas irregulares el Sniffer no se decide con toda la muestra,
+    # así que pruebo solo con la primera línea (el encabezado), como hace pandas
+    try:
+        encabezado = muestra.splitlines()[0] if muestra else ""
+        return csv.Sniffer().sniff(encabezado, delimiters=SEPARADORES_CSV).delimiter
+    except csv.Error:
+        # El Sniffer no encontró un separador claro
+        return None
+
+
+def limpiar_dataframe(df, columna_especie_original, columna_estandar, columna_extra=None):
     """
     Limpia y estandariza un DataFrame para que:
     - Tenga una columna con el nombre científico estandarizado (columna_estandar).
+    - Solo conserve esa columna y, si se pide, la columna extra.
     - Elimine filas sin nombre de especie.
     - Elimine duplicados por especie.
     - Normalice el texto (espacios, mayúsculas/minúsculas).
@@ -52,6 +241,7 @@ def limpiar_dataframe(df, columna_especie_original, columna_estandar):
     :param df: DataFrame original
     :param columna_especie_original: nombre de la columna de especie en ese DataFrame
     :param columna_estandar: nombre que queremos usar de forma estándar (ej. 'scientificName')
+    :param columna_extra: columna adicional que se quiere conservar (opcional; si no existe se ignora)
     :return: DataFrame limpio
     """
 
@@ -61,28 +251,30 @@ def limpiar_dataframe(df, columna_especie_original, columna_estandar):
             f"La columna '{columna_especie_original}' no existe en el archivo."
         )
 
-    # Hago una copia para no modificar el DataFrame original directamente
-    df_clean = df.copy()
+    # Me quedo solo con las columnas que voy a usar (las bases suelen traer muchísimas más)
+    columnas = [columna_especie_original]
+    if _usar_columna_extra(df, columna_especie_original, columna_estandar, columna_extra):
+        columnas.append(columna_extra)
+
+    # Copio solo esas columnas para no modificar el DataFrame original directamente
+    df_clean = df[columnas].copy()
 
     # Renombro la columna de especie original al nombre estándar que usará toda la app
     df_clean = df_clean.rename(
         columns={columna_especie_original: columna_estandar}
     )
 
-    # Normalizo la columna de especie:
-    # - Me aseguro que sea string
+    # Normalizo la columna de especie en una sola pasada con pyarrow:
+    # - Me aseguro que sea texto (los vacíos quedan como nulos, no como "nan")
     # - Quito espacios sobrantes al inicio y al final
-    df_clean[columna_estandar] = (
-        df_clean[columna_estandar]
-        .astype(str)   # Convierto todo a texto
-        .str.strip()   # Quito espacios al principio y al final
-    )
+    # - Paso todo a minúsculas para comparar nombres sin problemas de mayúsculas/minúsculas
+    especies = pa.array(df_clean[columna_estandar].astype("string[pyarrow]"))
+    especies = pc.utf8_lower(pc.utf8_trim_whitespace(especies))
+    df_clean[columna_estandar] = pd.array(especies, dtype="string[pyarrow]")
 
-    # Elimino filas donde la especie haya quedado vacía
-    df_clean = df_clean[df_clean[columna_estandar] != ""]
-
-    # Paso todo a minúsculas para comparar nombres sin problemas de mayúsculas/minúsculas
-    df_clean[columna_estandar] = df_clean[columna_estandar].str.lower()
+    # Elimino filas donde la especie haya quedado vacía o nula
+    con_especie = pc.fill_null(pc.not_equal(especies, ""), False)
+    df_clean = df_clean[con_especie.to_numpy(zero_copy_only=False)]
 
     # Elimino duplicados por nombre de especie dentro de esta fuente
     df_clean = df_clean.drop_duplicates(subset=[columna_estandar])
@@ -91,75 +283,154 @@ def limpiar_dataframe(df, columna_especie_original, columna_estandar):
     return df_clean
 
 
+def _usar_columna_extra(df, columna_especie_original, columna_estandar, columna_extra):
+    """
+    Decide si la columna extra se puede conservar junto a la de especie.
+    :param df: DataFrame original
+    :param columna_especie_original: nombre de la columna de especie en ese DataFrame
+    :param columna_estandar: nombre estándar de la columna de especie (ej. 'scientificName')
+    :param columna_extra: columna adicional pedida (puede ser "" o None)
+    :return: True si existe y no choca con la columna de especie (ni antes ni después de renombrarla)
+    """
+    return bool(
+        columna_extra
+        and columna_extra in df.columns
+        and columna_extra not in (columna_especie_original, columna_estandar)
+    )
+
+
+def _matriz_presencia(species_sets):
+    """
+    Calcula la unión de especies de todas las fuentes y, para cada una,
+    en qué fuentes aparece.
+    :param species_sets: dict {nombre_fuente: pd.Index(especies)}
+    :return:
+        all_species: pd.Index con la unión de especies (con pocas fuentes, solo las que están en 2 o más)
+        presencia: matriz (especies x fuentes) con 1/True si la especie está en la fuente
+    """
+    indices = list(species_sets.values())
+    tipo = indices[0].dtype
+
+    if isinstance(tipo, pd.CategoricalDtype) and all(
+        especies.dtype == tipo for especies in indices
+    ):
+        # Si todas las fuentes comparten el tipo categórico, los códigos ya están hechos:
+        # los uso directamente en lugar de volver a convertir los nombres
+        # (la unión sigue siendo categórica, así la tabla también queda con esos códigos)
+        all_species = pd.CategoricalIndex(
+            pd.Categorical.from_codes(np.arange(len(tipo.categories)), dtype=tipo)
+        )
+        codigos = np.concatenate([especies.codes for especies in indices])
+    elif _marcar_presencia is not None:
+        # Con numba: convierto cada nombre en un número entero (un código por especie distinta)
+        codigos, all_species = pd.factorize(indices[0].append(indices[1:]))
+    else:
+        # Sin numba ni códigos: construyo la unión de índices (la hace pandas por dentro)
+        all_species = indices[0]
+        for especies in indices[1:]:
+            all_species = all_species.union(especies)
+
+        # y marco True si la especie está en esa fuente (isin compara toda la columna de una vez).
+        # Escribo cada columna directo en una matriz ya creada, sin listas intermedias
+        presencia = np.empty((len(all_species), len(indices)), dtype=bool)
+        for j, especies in enumerate(indices):
+            presencia[:, j] = all_species.isin(especies)
+        return all_species, presencia
+
+    limites = np.cumsum([0] + [len(especies) for especies in indices])
+
+    if _marcar_presencia is None:
+        # Con códigos pero sin numba: marco la presencia con numpy, una fuente a la vez
+        presencia = np.zeros((len(all_species), len(indices)), dtype=bool)
+        for j, (inicio, fin) in enumerate(zip(limites[:-1], limites[1:])):
+            presencia[codigos[inicio:fin], j] = True
+        return all_species, presencia
+
+    if len(indices) <= MAX_FUENTES_INTERSECCION_ORDENADA:
+        # Con pocas fuentes ordeno los códigos de cada una y las recorro a la vez con punteros:
+        # así solo guardo las especies comunes, sin armar la matriz de toda la unión
+        for inicio, fin in zip(limites[:-1], limites[1:]):
+            codigos[inicio:fin].sort()
+        codigos_comunes, presencia = _intersectar_ordenados(
+            codigos.astype(np.int64), limites.astype(np.int64), len(all_species)
+        )
+        return all_species[codigos_comunes], presencia
+
+    # Con muchas fuentes marco la presencia de toda la unión en código compilado
+    presencia = _marcar_presencia(
+        codigos.astype(np.int64), limites.astype(np.int64), len(all_species)
+    )
+    return all_species, presencia
+
+
+def _valores_para_ordenar(columna):
+    """
+    Devuelve los valores con los que se ordena una columna de la tabla.
+    Una columna categórica se ordenaría por sus códigos (el orden en que aparecieron
+    las especies), así que la paso a texto para ordenarla por nombre.
+    :param columna: pandas.Series a ordenar
+    :return: pandas.Series con los valores a comparar
+    """
+    if isinstance(columna.dtype, pd.CategoricalDtype):
+        return columna.astype(columna.cat.categories.dtype)
+    return columna
+
+
 def construir_interseccion(fuentes_limpias, columna_estandar):
     """
-    Construye:
-    - Un diccionario con el conjunto de especies únicas por fuente.
-    - Una tabla que indica, para cada especie presente en AL MENOS 2 fuentes,
-      en cuáles aparece y cuántas fuentes la reportan.
+    Construye una tabla que indica, para cada especie presente en AL MENOS 2 fuentes,
+    en cuáles aparece y cuántas fuentes la reportan.
 
     :param fuentes_limpias: dict {nombre_fuente: DataFrame_limpio}
     :param columna_estandar: nombre de la columna de especie estándar (ej. 'scientificName')
     :return:
-        species_sets: dict {nombre_fuente: set(especies)}
         tabla_interseccion: DataFrame con columnas:
             - columna_estandar
-            - nombre_fuente (0/1 si aparece o no)
-            - num_fuentes (cuántas fuentes la contienen)
+            - nombre_fuente (0/1 en int8 si aparece o no)
+            - num_fuentes (cuántas fuentes la contienen, entero pequeño)
     """
 
-    # Aquí voy a guardar, para cada fuente, el conjunto de especies únicas
+    # Aquí voy a guardar, para cada fuente, el índice (pd.Index) de especies únicas
     species_sets = {}
 
     # Recorro cada fuente y su DataFrame limpio
     for nombre_fuente, df in fuentes_limpias.items():
         # Tomo la columna de especie, elimino nulos y saco los valores únicos
-        especies = set(
+        especies = pd.Index(
             df[columna_estandar]
             .dropna()
             .unique()
         )
-        # Guardo el conjunto de especies para esta fuente
+        # Guardo las especies de esta fuente
         species_sets[nombre_fuente] = especies
 
-    # Si no hay ninguna fuente, devuelvo estructuras vacías
+    # Si no hay ninguna fuente, devuelvo una tabla vacía
     if not species_sets:
-        return {}, pd.DataFrame(columns=[columna_estandar])
-
-    # Aquí construyo la unión de todas las especies de todas las fuentes
-    all_species = set()
-    for conj in species_sets.values():
-        all_species |= conj  # Operación de unión de conjuntos
-
-    # En esta lista voy a ir armando las filas de la tabla final
-    filas = []
-    # Recorro cada especie que apareció en al menos una fuente
-    for especie in all_species:
-        # Creo un diccionario que indica si la especie está (True/False) en cada fuente
-        presencia = {
-            nombre_fuente: (especie in conj)
-            for nombre_fuente, conj in species_sets.items()
+        return pd.DataFrame(columns=[columna_estandar])
+
+    # Armo la unión de todas las especies y una matriz de presencia
+    # (una fila por especie de la unión, una columna por fuente)
+    all_species, presencia = _matriz_presencia(species_sets)
+
+    # Cuento en cuántas fuentes aparece cada especie
+    # (downcast deja el conteo en el entero más pequeño que alcance, normalmente int8)
+    num_fuentes = pd.to_numeric(presencia.sum(axis=1), downcast="integer")
+
+    # Solo me interesan las especies que están en 2 o más bases
+    en_varias = num_fuentes >= 2
+    presencia = presencia[en_varias]
+
+    # Armo la tabla recortando cada columna una sola vez (1 si está, 0 si no, en int8)
+    tabla_interseccion = pd.DataFrame(
+        {
+            columna_estandar: all_species[en_varias],
+            "num_fuentes": num_fuentes[en_varias],
+            **{
+                nombre_fuente: presencia[:, j].astype(np.int8)
+                for j, nombre_fuente in enumerate(species_sets)
+            },
         }
-
-        # Cuento en cuántas fuentes aparece esta especie
-        num_fuentes = sum(presencia.values())
-
-        # Solo me interesan las especies que están en 2 o más bases
-        if num_fuentes >= 2:
-            # Empiezo a armar la fila con el nombre científico y num_fuentes
-            fila = {
-                columna_estandar: especie,
-                "num_fuentes": num_fuentes,
-            }
-            # Para cada fuente, guardo 1 si está, 0 si no está
-            for nombre_fuente, presente in presencia.items():
-                fila[nombre_fuente] = 1 if presente else 0
-
-            # Agrego la fila a la lista de filas
-            filas.append(fila)
-
-    # Convierto la lista de diccionarios (filas) en un DataFrame
-    tabla_interseccion = pd.DataFrame(filas)
+    )
 
     # Si la tabla no está vacía, la ordeno:
     # primero por num_fuentes (de mayor a menor) y luego por nombre científico
@@ -167,9 +438,237 @@ def construir_interseccion(fuentes_limpias, columna_estandar):
         tabla_interseccion = tabla_interseccion.sort_values(
             by=["num_fuentes", columna_estandar],
             ascending=[False, True],
+            key=_valores_para_ordenar,
         ).reset_index(drop=True)
 
-    # Devuelvo:
-    # - species_sets: conjuntos de especies por fuente
-    # - tabla_interseccion: tabla de especies presentes en >= 2 fuentes
-    return species_sets, tabla_interseccion
+    # Devuelvo la tabla de especies presentes en >= 2 fuentes
+    return tabla_interseccion
+
+
+def _filtrar_por_busqueda(df, columna, busqueda):
+    """
+    Deja solo las filas cuya especie contiene todos los términos de la búsqueda
+    (separados por espacios, sin importar mayúsculas/minúsculas).
+    :param df: DataFrame limpio
+    :param columna: columna de especie donde buscar
+    :param busqueda: texto escrito en el buscador
+    :return: DataFrame filtrado (el mismo si la búsqueda es muy corta)
+    """
+    busqueda = (busqueda or "").strip()
+
+    # Con menos de 2 letras casi todo coincide, así que no filtro
+    if len(busqueda) < 2:
+        return df
+
+    # Cada término se busca como texto literal (sin regex): pyarrow lo resuelve en C++
+    # y con varios términos junto las coincidencias, una pasada por término
+    coincide = None
+    for termino in busqueda.split():
+        mascara = df[columna].str.contains(termino, case=False, na=False, regex=False)
+        coincide = mascara if coincide is None else coincide & mascara
+
+    return df[coincide.fillna(False).astype(bool)]
+
+
+def _especies_a_categoricas(fuentes_limpias, columna_estandar):
+    """
+    Convierte la columna de especie de todas las fuentes a un mismo CategoricalDtype.
+    Las especies se convierten en números una sola vez para todas las fuentes, y la
+    intersección trabaja directo con esos códigos (no vuelve a comparar textos).
+    :param fuentes_limpias: dict {nombre_fuente: DataFrame_limpio}
+    :param columna_estandar: nombre de la columna de especie estándar
+    :return: dict {nombre_fuente: DataFrame con la columna de especie categórica}
+    """
+    if not fuentes_limpias:
+        return fuentes_limpias
+
+    # Junto las especies de todas las fuentes y les doy un código entero a cada una
+    # (las categorías quedan en el orden en que aparecen, sin ordenar: ordenar todos los nombres es caro)
+    columnas = [df[columna_estandar] for df in fuentes_limpias.values()]
+    codigos, especies = pd.factorize(pd.concat(columnas, ignore_index=True))
+    tipo_especie = pd.CategoricalDtype(categories=especies)
+
+    # Reparto los códigos de vuelta entre las fuentes, sin volver a buscar cada nombre
+    limites = np.cumsum([0] + [len(columna) for columna in columnas])
+    return {
+        nombre_fuente: df.assign(
+            **{
+                columna_estandar: pd.Categorical.from_codes(
+                    codigos[inicio:fin], dtype=tipo_especie
+                )
+            }
+        )
+        for (nombre_fuente, df), inicio, fin in zip(
+            fuentes_limpias.items(), limites[:-1], limites[1:]
+        )
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=MAX_RESULTADOS_EN_CACHE, ttl=DURACION_CACHE)
+def construir_tabla_final(fuentes, columna_estandar, busqueda=""):
+    """
+    Hace todo el procesamiento de las fuentes de una vez (limpieza, búsqueda,
+    intersección y columnas extra). Queda en caché, así que si la app se recarga
+    sin que cambien las fuentes ni la búsqueda, no se vuelve a calcular nada.
+
+    :param fuentes: tupla de (nombre_fuente, DataFrame_original, columna_especie, columna_extra);
+                    columna_extra puede ser "" si no se quiere ninguna
+    :param columna_estandar: nombre de la columna de especie estándar (ej. 'scientificName')
+    :param busqueda: texto para filtrar especies por nombre (opcional)
+    :return:
+        species_counts: dict {nombre_fuente: número de especies únicas (sin aplicar la búsqueda)}
+        tabla_final: tabla de intersección con las columnas extra agregadas
+    """
+
+    fuentes_limpias = {}
+    extra_cols_map = {}
+
+    # 1. Limpieza por fuente
+    # Cada fuente se limpia por separado, así que las reparto entre varios hilos
+    # (los cálculos de pyarrow liberan el GIL y pueden correr a la vez)
+    def limpiar_fuente(fuente):
+        nombre_fuente, df_raw, columna_especie, columna_extra = fuente
+        # Limpio y estandarizo, quedándome solo con las columnas que uso
+        # (limpiar_dataframe no tiene caché propia: los hilos no tienen contexto de Streamlit
+        # y la caché de esta función ya cubre todo el procesamiento)
+        df_clean = limpiar_dataframe(
+            df_raw, columna_especie, columna_estandar, columna_extra
+        )
+        # Cuento las especies únicas antes de la búsqueda: los indicadores son de la fuente completa
+        # (limpiar_dataframe ya dejó una fila por especie, así que basta con el número de filas)
+        n_especies = len(df_clean)
+        # Si el usuario buscó algo, filtro desde aquí para no arrastrar filas de más a la intersección
+        return n_especies, _filtrar_por_busqueda(df_clean, columna_estandar, busqueda)
+
+    n_hilos = max(1, min(MAX_HILOS_LIMPIEZA, len(fuentes)))
+    with ThreadPoolExecutor(max_workers=n_hilos) as ejecutor:
+        limpias = list(ejecutor.map(limpiar_fuente, fuentes))
+
+    species_counts = {}
+    for (nombre_fuente, df_raw, columna_especie, columna_extra), (n_especies, df_clean) in zip(
+        fuentes, limpias
+    ):
+        species_counts[nombre_fuente] = n_especies
+        fuentes_limpias[nombre_fuente] = df_clean
+
+        # Guardo la columna extra solo si limpiar_dataframe la conservó
+        # (lo decido con los nombres originales: en el limpio la especie ya se llama como el estándar)
+        if _usar_columna_extra(df_raw, columna_especie, columna_estandar, columna_extra):
+            extra_cols_map[nombre_fuente] = columna_extra
+
+    # Paso la columna de especie de todas las fuentes a un mismo tipo categórico:
+    # así la intersección y el join comparan códigos enteros en lugar de textos
+    fuentes_limpias = _especies_a_categoricas(fuentes_limpias, columna_estandar)
+
+    # 2. Intersección de especies
+    # (sus conteos por fuente ya vienen filtrados por la búsqueda, así que uso los de arriba)
+    tabla_interseccion = construir_interseccion(
+        fuentes_limpias, columna_estandar
+    )
+
+    # 3. Agregar columnas extra
+    # Busco cada especie por su código (un entero) y no por el nombre: todas las fuentes
+    # comparten las mismas categorías, así que el mismo código es la misma especie.
+    # Cada Series queda alineada con las filas de la intersección, así que se pegan
+    # tal cual, sin arrastrar especies de más ni convertir las columnas 0/1 a decimales
+    # (limpiar_dataframe ya dejó una sola fila por especie, así que no hace falta quitar duplicados)
+    if extra_cols_map:
+        codigos_tabla = tabla_interseccion[columna_estandar].cat.codes
+        extras = [
+            fuentes_limpias[nombre_fuente][columna_extra]
+            .set_axis(fuentes_limpias[nombre_fuente][columna_estandar].cat.codes)
+            .reindex(codigos_tabla)
+            .set_axis(tabla_interseccion.index)
+            .rename(f"{nombre_fuente}_{columna_extra}")
+            for nombre_fuente, columna_extra in extra_cols_map.items()
+        ]
+        tabla_final = pd.concat([tabla_interseccion, *extras], axis=1)
+    else:
+        tabla_final = tabla_interseccion.copy()
+
+    # En la tabla final vuelvo a dejar la especie como texto: las categorías solo servían
+    # para calcular, y así la tabla que se muestra y se descarga no arrastra los códigos
+    if isinstance(tabla_final[columna_estandar].dtype, pd.CategoricalDtype):
+        especies = tabla_final[columna_estandar]
+        tabla_final[columna_estandar] = especies.astype(especies.cat.categories.dtype)
+
+    return species_counts, tabla_final
+
+
+@st.cache_data(show_spinner=False, max_entries=MAX_RESUMENES_EN_CACHE, ttl=DURACION_CACHE)
+def categorias_mas_frecuentes(_df, clave, columna, n=10):
+    """
+    Cuenta las categorías más frecuentes de una columna.
+    Queda en caché para que cambiar la columna en la app no repita el conteo.
+    La tabla no se usa para la caché (empieza con "_"): la identifico con una clave
+    pequeña, así no hay que revisar toda la tabla cada vez que cambia la columna.
+    :param _df: DataFrame con los resultados
+    :param clave: valor que identifica esa tabla (por ejemplo, las entradas con que se calculó)
+    :param columna: columna categórica a resumir
+    :param n: cuántas categorías devolver
+    :return: pandas.Series con las n categorías más frecuentes y su conteo
+    """
+    return _df[columna].value_counts().head(n)
+
+
+@st.cache_data(show_spinner=False, max_entries=MAX_RESULTADOS_EN_CACHE, ttl=DURACION_CACHE)
+def tabla_a_csv(df, separador=";"):
+    """
+    Convierte un DataFrame en los bytes de un CSV (UTF-8 con BOM) listo para descargar.
+    Escribe directo en un buffer de bytes, sin armar antes todo el texto en memoria.
+    El formato es el mismo de df.to_csv: comillas solo donde hacen falta.
+    :param df: DataFrame a exportar
+    :param separador: separador de columnas
+    :return: bytes del CSV
+    """
+    buffer = io.BytesIO()
+    buffer.write(BOM_UTF8)
+
+    try:
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, ValueError, TypeError):
+        tabla = None
+
+    # pyarrow escribe los decimales, booleanos y fechas distinto que pandas,
+    # así que solo lo uso cuando todas las columnas son texto o enteros
+    if tabla is not None and all(
+        pa.types.is_string(tipo)
+        or pa.types.is_large_string(tipo)
+        or pa.types.is_integer(tipo)
+        or pa.types.is_null(tipo)
+        for tipo in tabla.schema.types
+    ):
+        try:
+            # Escribo el encabezado como lo hace pandas (pyarrow siempre le pone comillas)
+            encabezado = io.StringIO()
+            csv.writer(encabezado, delimiter=separador, lineterminator="\n").writerow(df.columns)
+            buffer.write(encabezado.getvalue().encode("utf-8"))
+
+            # y las filas con el escritor de CSV de pyarrow (en C++ y con varios hilos), sin comillas
+            pa_csv.write_csv(
+                tabla,
+                buffer,
+                write_options=pa_csv.WriteOptions(
+                    delimiter=separador,
+                    include_header=False,
+                    quoting_style="none",
+                ),
+            )
+            return buffer.getvalue()
+        except (pa.ArrowException, ValueError):
+            # Algún texto trae el separador, comillas o saltos de línea:
+            # pyarrow no sabe ponerle comillas solo a ese, así que sigo con pandas
+            pass
+
+    # Si pyarrow no puede con la tabla, dejo que pandas la escriba por bloques
+    buffer.seek(len(BOM_UTF8))
+    buffer.truncate()
+    df.to_csv(
+        buffer,
+        index=False,
+        sep=separador,
+        encoding="utf-8",
+        chunksize=FILAS_POR_BLOQUE_CSV,
+    )
+
+    return buffer.getvalue()